@@ -1,15 +1,22 @@
 import asyncio
+import functools
+import hmac
 import logging
 import re
 import sys
 import os
+import threading
+import time
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import date, datetime
+from typing import Final
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Query, HTTPException
+from fastapi import BackgroundTasks, FastAPI, Request, Query, HTTPException
 from fastapi.responses import PlainTextResponse
+import ahocorasick
 import httpx
+import orjson
 from openpyxl import load_workbook
 
 load_dotenv(".env.local")
@@ -28,15 +35,22 @@ logger = logging.getLogger("whatsapp-bot")
 # ──────────────────────────────────────────────
 # Constants – loaded from .env.local
 # ──────────────────────────────────────────────
-VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "")
-ACCESS_TOKEN = os.getenv("ACCESS_TOKEN", "")
-PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID", "")
+VERIFY_TOKEN: Final[str] = os.getenv("VERIFY_TOKEN", "")
+ACCESS_TOKEN: Final[str] = os.getenv("ACCESS_TOKEN", "")
+PHONE_NUMBER_ID: Final[str] = os.getenv("PHONE_NUMBER_ID", "")
 
-GRAPH_API_URL = (
+GRAPH_API_URL: Final[str] = (
     f"https://graph.facebook.com/v21.0/{PHONE_NUMBER_ID}/messages"
 )
 
-BOOKING_FILE = os.path.join(os.path.dirname(__file__), "Kapila booking.xlsx")
+# Sent with each Graph API call only – not as client defaults, so the
+# self-ping to our own URL never carries the access token.
+_HEADERS = {
+    "Authorization": f"Bearer {ACCESS_TOKEN}",
+    "Content-Type": "application/json",
+}
+
+BOOKING_FILE: Final[str] = os.path.join(os.path.dirname(__file__), "Kapila booking.xlsx")
 
 
 # ──────────────────────────────────────────────
@@ -59,122 +73,187 @@ MONTH_MAP = {
 }
 
 
+# Patterns in priority order, merged into one alternation so the text is
+# scanned once. Each alternative is wrapped in a named group; its inner
+# groups follow it directly, so they're read relative to m.lastindex.
+_DATE_RE = re.compile("|".join(
+    f"(?P<{kind}>{DATE_PATTERNS[i]})"
+    for kind, i in (("dmy", 0), ("dmy_short", 1), ("ordinal", 3), ("named", 2))
+))
+
+
+# Current year, re-read from the wall clock at most once a minute.
+_YEAR_TTL = 60
+_year_cache = [datetime.now().year, time.monotonic()]
+
+
+def _current_year() -> int:
+    now = time.monotonic()
+    if now - _year_cache[1] > _YEAR_TTL:
+        _year_cache[:] = [datetime.now().year, now]
+    return _year_cache[0]
+
+
+# Longer messages are parsed uncached to keep cache keys small.
+_DATE_CACHE_MAX_KEY = 128
+
+
 def parse_date(text: str) -> datetime | None:
     """Try to extract a date from free-form user text."""
-    t = text.lower().strip()
-    current_year = datetime.now().year
+    return _parse_date_normalized(text.lower().strip())
 
-    # dd/mm/yyyy or dd-mm-yyyy or dd.mm.yyyy
-    m = re.search(DATE_PATTERNS[0], t)
-    if m:
-        try:
-            return datetime(int(m.group(3)), int(m.group(2)), int(m.group(1)))
-        except ValueError:
-            pass
 
-    # dd/mm/yy
-    m = re.search(DATE_PATTERNS[1], t)
-    if m:
-        try:
-            yr = int(m.group(3))
-            yr = yr + 2000 if yr < 100 else yr
-            return datetime(yr, int(m.group(2)), int(m.group(1)))
-        except ValueError:
-            pass
-
-    # 14th feb 2026 (with ordinal suffix)
-    m = re.search(DATE_PATTERNS[3], t)
-    if m:
-        try:
-            day = int(m.group(1))
-            mon = MONTH_MAP.get(m.group(3)[:3], 0)
-            yr = int(m.group(4)) if m.group(4) else current_year
-            return datetime(yr, mon, day)
-        except (ValueError, KeyError):
-            pass
+def _parse_date_normalized(t: str) -> datetime | None:
+    """parse_date for text that is already lowercased and stripped."""
+    if len(t) > _DATE_CACHE_MAX_KEY:
+        return _parse_date_cached.__wrapped__(t, _current_year())
+    return _parse_date_cached(t, _current_year())
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_cached(t: str, current_year: int) -> datetime | None:
+    """
+    Memoized body of parse_date. current_year is part of the key so
+    year-less dates ("14 feb") resolve correctly after New Year.
+    """
+    month_map = MONTH_MAP
 
-    # 14 feb or 14 feb 2026 (without ordinal)
-    m = re.search(DATE_PATTERNS[2], t)
-    if m:
+    for m in _DATE_RE.finditer(t):
+        kind = m.lastgroup
+        g = m.groups()[m.lastindex:]
         try:
-            day = int(m.group(1))
-            mon = MONTH_MAP.get(m.group(2)[:3], 0)
-            yr = int(m.group(3)) if m.group(3) else current_year
+            # dd/mm/yyyy or dd-mm-yyyy or dd.mm.yyyy
+            if kind == "dmy":
+                return datetime(int(g[2]), int(g[1]), int(g[0]))
+
+            # dd/mm/yy
+            if kind == "dmy_short":
+                yr = int(g[2])
+                yr = yr + 2000 if yr < 100 else yr
+                return datetime(yr, int(g[1]), int(g[0]))
+
+            # 14th feb 2026 (with ordinal suffix)
+            if kind == "ordinal":
+                day = int(g[0])
+                mon = month_map[g[2]]
+                yr = int(g[3]) if g[3] else current_year
+                return datetime(yr, mon, day)
+
+            # 14 feb or 14 feb 2026 (without ordinal)
+            day = int(g[0])
+            mon = month_map[g[1]]
+            yr = int(g[2]) if g[2] else current_year
             return datetime(yr, mon, day)
         except (ValueError, KeyError):
-            pass
+            continue
 
     return None
 
 
-def check_availability(target_date: datetime) -> str:
-    """
-    Look up target_date in the Excel sheet and return an availability message.
-    """
-    date_str = target_date.strftime("%d-%m-%Y")
-    display = target_date.strftime("%d %b %Y")
+_BOOKING_CACHE: dict[date, tuple[int, int, float | None]] = {}
+_BOOKING_MTIME = 0.0
+_BOOKING_LOCK = threading.Lock()
 
-    try:
-        wb = load_workbook(BOOKING_FILE, read_only=True, data_only=True)
-        ws = wb.active
 
-        headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-        room_indices = [headers.index(r) for r in ROOM_COLUMNS if r in headers]
+def _load_bookings() -> None:
+    """
+    (Re)build the in-memory booking index if the Excel file changed on disk.
+    """
+    global _BOOKING_CACHE, _BOOKING_MTIME
 
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            cell_date = row[0]
-            if cell_date is None:
-                continue
+    with _BOOKING_LOCK:
+        mtime = os.stat(BOOKING_FILE).st_mtime
+        if mtime == _BOOKING_MTIME:
+            return
 
-            if isinstance(cell_date, datetime):
-                row_date_str = cell_date.strftime("%d-%m-%Y")
-            else:
-                row_date_str = str(cell_date).strip()
+        wb = load_workbook(BOOKING_FILE, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            rows = ws.iter_rows(values_only=True)
+
+            headers = list(next(rows, ()))
+            room_indices = [headers.index(r) for r in ROOM_COLUMNS if r in headers]
+            tariff_idx = headers.index("Tariff") if "Tariff" in headers else None
+
+            bookings = {}
+            for row in rows:
+                cell_date = row[0]
+                if cell_date is None:
+                    continue
+
+                # Key on the date itself so lookups skip strftime entirely.
+                if isinstance(cell_date, datetime):
+                    row_date = cell_date.date()
+                else:
+                    try:
+                        row_date = datetime.strptime(str(cell_date).strip(), "%d-%m-%Y").date()
+                    except ValueError:
+                        continue
 
-            if row_date_str == date_str:
-                tariff_idx = headers.index("Tariff") if "Tariff" in headers else None
                 tariff = row[tariff_idx] if tariff_idx is not None else None
 
                 empty_rooms = sum(1 for i in room_indices if row[i] is None)
                 booked_rooms = len(room_indices) - empty_rooms
 
-                logger.info(
-                    "availability  | date=%s | booked=%s | empty=%s",
-                    date_str, booked_rooms, empty_rooms,
-                )
-
-                if empty_rooms > 0:
-                    tariff_line = (
-                        f"💰 Tariff: *₹{tariff:,.0f}* per room/night\n"
-                        if tariff else ""
-                    )
-                    return (
-                        f"✅ *Rooms available on {display}!*\n\n"
-                        f"🛏 Available: *{empty_rooms}* of 5 rooms\n"
-                        f"📌 Booked: {booked_rooms} of 5\n"
-                        f"{tariff_line}\n"
-                        "To book, please share:\n"
-                        "1️⃣ Number of guests\n"
-                        "2️⃣ Number of rooms\n"
-                        "3️⃣ Traveling with pets?\n\n"
-                        "Or type *book* for full booking details."
-                    )
-                else:
-                    return (
-                        f"❌ *Sorry, fully booked on {display}.*\n\n"
-                        "All 5 rooms are occupied on this date.\n\n"
-                        "💡 Try a nearby date or contact reception:\n"
-                        "📞 *+91-XXXXX-XXXXX*"
-                    )
-
-        wb.close()
-        return (
-            f"📅 *{display}*\n\n"
-            "We don't have this date in our booking sheet yet.\n"
-            "Please contact reception for availability:\n"
-            "📞 *+91-XXXXX-XXXXX*"
+                bookings.setdefault(row_date, (empty_rooms, booked_rooms, tariff))
+        finally:
+            wb.close()
+
+        # Rebind rather than mutate in place – lock-free readers see either
+        # the old index or the new one, never a half-filled dict.
+        _BOOKING_CACHE = bookings
+        _BOOKING_MTIME = mtime
+        logger.info("availability  | loaded %s dates from %s", len(bookings), BOOKING_FILE)
+
+
+def check_availability(target_date: datetime) -> str:
+    """
+    Look up target_date in the Excel sheet and return an availability message.
+    """
+    display = target_date.strftime("%d %b %Y")
+
+    try:
+        _load_bookings()
+        booking = _BOOKING_CACHE.get(target_date.date())
+
+        if booking is None:
+            return (
+                f"📅 *{display}*\n\n"
+                "We don't have this date in our booking sheet yet.\n"
+                "Please contact reception for availability:\n"
+                "📞 *+91-XXXXX-XXXXX*"
+            )
+
+        empty_rooms, booked_rooms, tariff = booking
+        logger.info(
+            "availability  | date=%s | booked=%s | empty=%s",
+            target_date.strftime("%d-%m-%Y"), booked_rooms, empty_rooms,
         )
 
+        if empty_rooms > 0:
+            tariff_line = (
+                f"💰 Tariff: *₹{tariff:,.0f}* per room/night\n"
+                if tariff else ""
+            )
+            return (
+                f"✅ *Rooms available on {display}!*\n\n"
+                f"🛏 Available: *{empty_rooms}* of 5 rooms\n"
+                f"📌 Booked: {booked_rooms} of 5\n"
+                f"{tariff_line}\n"
+                "To book, please share:\n"
+                "1️⃣ Number of guests\n"
+                "2️⃣ Number of rooms\n"
+                "3️⃣ Traveling with pets?\n\n"
+                "Or type *book* for full booking details."
+            )
+        else:
+            return (
+                f"❌ *Sorry, fully booked on {display}.*\n\n"
+                "All 5 rooms are occupied on this date.\n\n"
+                "💡 Try a nearby date or contact reception:\n"
+                "📞 *+91-XXXXX-XXXXX*"
+            )
+
     except FileNotFoundError:
         logger.error("availability  | file not found: %s", BOOKING_FILE)
         return (
@@ -191,8 +270,8 @@ def check_availability(target_date: datetime) -> str:
         )
 
 
-RENDER_URL = os.getenv("RENDER_EXTERNAL_URL", "")
-PING_INTERVAL = 14 * 60  # 14 minutes
+RENDER_URL: Final[str] = os.getenv("RENDER_EXTERNAL_URL", "")
+PING_INTERVAL: Final[int] = 14 * 60  # 14 minutes
 
 
 # ──────────────────────────────────────────────
@@ -210,25 +289,38 @@ async def keep_alive() -> None:
     while True:
         await asyncio.sleep(PING_INTERVAL)
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, timeout=10)
-                logger.info("keep_alive    | pinged %s – status %s", url, resp.status_code)
+            resp = await app.state.http.head(url)
+            logger.info("keep_alive    | pinged %s – status %s", url, resp.status_code)
         except Exception as exc:
             logger.error("keep_alive    | ping failed: %s", exc)
 
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
+    try:
+        _load_bookings()
+    except Exception as exc:
+        logger.error("availability  | could not preload %s: %s", BOOKING_FILE, exc)
+
+    # One pooled client for every outbound call, so TCP + TLS to the
+    # Graph API are reused across messages instead of redone per send.
+    application.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(10.0, connect=5.0),
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+    )
+
     task = asyncio.create_task(keep_alive())
     yield
     task.cancel()
+    await application.state.http.aclose()
 
 
 app = FastAPI(title="WhatsApp Enquiry Bot", lifespan=lifespan)
 
 
-@app.get("/ping")
-async def ping():
+@app.api_route("/ping", methods=["GET", "HEAD"])
+async def ping() -> dict[str, str]:
     """Health-check endpoint used by the self-ping task and uptime monitors."""
     return {"status": "alive"}
 
@@ -236,326 +328,355 @@ async def ping():
 # ──────────────────────────────────────────────
 # Rule-based reply generator
 # ──────────────────────────────────────────────
-def generate_reply(text: str) -> str:
-    """Return a reply based on keyword matching against real Kapila resort info."""
-    t = text.lower()
+# Keyword groups in priority order – the first group with a hit wins.
+REPLY_KEYWORDS = [
+    ("greeting", ("hi", "hello", "hey", "hii")),
+    ("price", ("price", "cost", "rate", "tariff", "charge", "fee")),
+    ("newyear", ("new year", "newyear", "nye", "31 dec", "31st dec", "30 dec",
+                 "30th dec", "1 jan", "1st jan", "gala")),
+    ("room", ("room", "bed", "stay", "accommodation", "villa")),
+    ("book", ("book", "reserve", "available", "availability", "checkin", "check-in",
+              "checkout", "check-out")),
+    ("pet", ("pet", "dog", "cat", "puppy", "animal")),
+    ("cancel", ("cancel", "cancellation", "refund", "policy")),
+    ("payment", ("payment", "pay", "bank", "account", "upi", "transfer", "neft",
+                 "imps", "ifsc")),
+    ("activities", ("activit", "sport", "outdoor", "play", "game", "cricket",
+                    "badminton", "football", "basketball", "archery", "cycling",
+                    "indoor", "table tennis", "foosball", "carrom", "chess")),
+    ("amenities", ("amenit", "facilit", "include", "provide", "offer")),
+    ("pool", ("pool", "swim", "swimming")),
+    ("location", ("location", "address", "direction", "where", "reach", "map",
+                  "route", "mysore", "mysuru")),
+    ("food", ("food", "meal", "breakfast", "lunch", "dinner", "dining", "eat",
+              "restaurant", "tea", "drink")),
+    ("valentine", ("valentine", "14 feb", "14th feb")),
+    ("dasara", ("dasara", "dussehra", "october fest")),
+    ("thanks", ("thank", "thanks", "bye", "goodbye", "see you")),
+    ("menu", ("menu", "help", "option", "what can")),
+]
+
+
+def _build_keyword_automaton() -> ahocorasick.Automaton:
+    """Compile every reply keyword into one Aho-Corasick automaton."""
+    automaton = ahocorasick.Automaton()
+    for priority, (category, keywords) in enumerate(REPLY_KEYWORDS):
+        for kw in keywords:
+            # Keep the higher-priority category if a keyword appears twice.
+            if kw not in automaton:
+                automaton.add_word(kw, (priority, category))
+    automaton.make_automaton()
+    return automaton
+
 
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+
+def _classify(t: str) -> str | None:
+    """Return the highest-priority reply category whose keyword occurs in t."""
+    best = None
+    for _, hit in _KEYWORD_AUTOMATON.iter(t):
+        if best is None or hit < best:
+            best = hit
+            if hit[0] == 0:
+                break  # nothing outranks the first group
+    return best[1] if best else None
+
+
+# Canned replies keyed by REPLY_KEYWORDS category, built once at import.
+REPLIES = {
     # ── Greeting ──
-    if any(w in t for w in ("hi", "hello", "hey", "hii")):
-        return (
-            "Welcome to *Kapila River Front*! 🌿🏨\n"
-            "A Luxury Farm Villa on the Riverside\n\n"
-            "Here's what I can help you with:\n"
-            "🛏 *room* – Room details\n"
-            "💰 *price* – 2026 Rate card\n"
-            "📅 *book* – Booking enquiry\n"
-            "🐾 *pet* – Pet policy & charges\n"
-            "🎯 *activities* – Sports & games\n"
-            "🌿 *amenities* – Facilities\n"
-            "🍽 *food* – Dining & meals\n"
-            "📍 *location* – How to reach us\n"
-            "❌ *cancel* – Cancellation policy\n"
-            "🏦 *payment* – Bank & payment info\n"
-            "📋 *menu* – Full keyword list\n\n"
-            "Or just type your question! 😊"
-        )
+    "greeting": (
+        "Welcome to *Kapila River Front*! 🌿🏨\n"
+        "A Luxury Farm Villa on the Riverside\n\n"
+        "Here's what I can help you with:\n"
+        "🛏 *room* – Room details\n"
+        "💰 *price* – 2026 Rate card\n"
+        "📅 *book* – Booking enquiry\n"
+        "🐾 *pet* – Pet policy & charges\n"
+        "🎯 *activities* – Sports & games\n"
+        "🌿 *amenities* – Facilities\n"
+        "🍽 *food* – Dining & meals\n"
+        "📍 *location* – How to reach us\n"
+        "❌ *cancel* – Cancellation policy\n"
+        "🏦 *payment* – Bank & payment info\n"
+        "📋 *menu* – Full keyword list\n\n"
+        "Or just type your question! 😊"
+    ),
 
     # ── Pricing / Rate card ──
-    if any(w in t for w in ("price", "cost", "rate", "tariff", "charge", "fee")):
-        return (
-            "💰 *Kapila River Front – 2026 Rate Card*\n\n"
-            "All rates are *per room, per night* for "
-            "*double occupancy*, *inclusive of all meals* "
-            "(welcome drinks, lunch, high tea, dinner & breakfast).\n\n"
-            "📌 *Regular (Non-Seasonal):*\n"
-            "• Weekdays: *₹10,000*\n"
-            "• Weekends / Holidays: *₹12,000*\n\n"
-            "📌 *March – May:*\n"
-            "• Weekdays: *₹12,000*\n"
-            "• Weekends: *₹13,000*\n\n"
-            "📌 *Dasara (10-day festival):*\n"
-            "• All days: *₹13,000*\n\n"
-            "📌 *December 1–15:*\n"
-            "• All days: *₹13,000*\n\n"
-            "📌 *December 15–29:*\n"
-            "• All days: *₹14,000*\n\n"
-            "📌 *January 2 – First weekend:*\n"
-            "• All days: *₹14,000*\n\n"
-            "📌 *January 5–15:*\n"
-            "• All days: *₹12,000*\n\n"
-            "📌 *Valentine's Day (14 Feb):*\n"
-            "• *₹14,000* per night\n\n"
-            "Type *newyear* for the NYE special package!\n"
-            "Type *pet* for pet charges or *book* to enquire."
-        )
+    "price": (
+        "💰 *Kapila River Front – 2026 Rate Card*\n\n"
+        "All rates are *per room, per night* for "
+        "*double occupancy*, *inclusive of all meals* "
+        "(welcome drinks, lunch, high tea, dinner & breakfast).\n\n"
+        "📌 *Regular (Non-Seasonal):*\n"
+        "• Weekdays: *₹10,000*\n"
+        "• Weekends / Holidays: *₹12,000*\n\n"
+        "📌 *March – May:*\n"
+        "• Weekdays: *₹12,000*\n"
+        "• Weekends: *₹13,000*\n\n"
+        "📌 *Dasara (10-day festival):*\n"
+        "• All days: *₹13,000*\n\n"
+        "📌 *December 1–15:*\n"
+        "• All days: *₹13,000*\n\n"
+        "📌 *December 15–29:*\n"
+        "• All days: *₹14,000*\n\n"
+        "📌 *January 2 – First weekend:*\n"
+        "• All days: *₹14,000*\n\n"
+        "📌 *January 5–15:*\n"
+        "• All days: *₹12,000*\n\n"
+        "📌 *Valentine's Day (14 Feb):*\n"
+        "• *₹14,000* per night\n\n"
+        "Type *newyear* for the NYE special package!\n"
+        "Type *pet* for pet charges or *book* to enquire."
+    ),
 
     # ── New Year special package ──
-    if any(w in t for w in ("new year", "newyear", "nye", "31 dec", "31st dec",
-                             "30 dec", "30th dec", "1 jan", "1st jan", "gala")):
-        return (
-            "🎆 *New Year Special Package 2026*\n\n"
-            "✨ *Mandatory Full Property Booking*\n"
-            "📅 2 Nights / 3 Days\n\n"
-            "*Option 1:*\n"
-            "• Check-in: 30th December\n"
-            "• Check-out: 1st January\n\n"
-            "*Option 2:*\n"
-            "• Check-in: 31st December\n"
-            "• Check-out: 2nd January\n\n"
-            "💰 *Total Package: ₹2,25,000*\n\n"
-            "✅ *Includes:*\n"
-            "• All 5 rooms (10 pax)\n"
-            "• All meals included\n"
-            "• Firecrackers\n"
-            "• *New Year Gala Dinner with Barbecue* 🥂\n\n"
-            "⚠️ Non-divisible – must be booked as "
-            "a full property buyout.\n\n"
-            "Type *book* to enquire or *price* for the full rate card."
-        )
+    "newyear": (
+        "🎆 *New Year Special Package 2026*\n\n"
+        "✨ *Mandatory Full Property Booking*\n"
+        "📅 2 Nights / 3 Days\n\n"
+        "*Option 1:*\n"
+        "• Check-in: 30th December\n"
+        "• Check-out: 1st January\n\n"
+        "*Option 2:*\n"
+        "• Check-in: 31st December\n"
+        "• Check-out: 2nd January\n\n"
+        "💰 *Total Package: ₹2,25,000*\n\n"
+        "✅ *Includes:*\n"
+        "• All 5 rooms (10 pax)\n"
+        "• All meals included\n"
+        "• Firecrackers\n"
+        "• *New Year Gala Dinner with Barbecue* 🥂\n\n"
+        "⚠️ Non-divisible – must be booked as "
+        "a full property buyout.\n\n"
+        "Type *book* to enquire or *price* for the full rate card."
+    ),
 
     # ── Room details ──
-    if any(w in t for w in ("room", "bed", "stay", "accommodation", "villa")):
-        return (
-            "🏨 *Kapila River Front – Room Details*\n\n"
-            "We have *5 identical Heritage Rooms*.\n\n"
-            "✨ *Room highlights:*\n"
-            "• Spacious high-ceiling interior with warm wooden furnishings\n"
-            "• Handcrafted wooden bed with elegant ambient lighting\n"
-            "• Patterned flooring & tasteful wall art\n"
-            "• Private balcony sit-out with comfortable seating\n"
-            "• Large glass doors – seamless indoor-outdoor flow\n"
-            "• Attached modern washroom with modern fittings\n\n"
-            "🔌 *In-room facilities:*\n"
-            "• Air Conditioning (A/C)\n"
-            "• Television (TV)\n"
-            "• Hot water kettle\n\n"
-            "👥 *Occupancy:*\n"
-            "• Min 2 / Max 3 guests per room\n"
-            "• Total: 5 rooms → up to 15 guests (with extra beds)\n\n"
-            "ℹ️ One room type only. No river-facing view.\n\n"
-            "Type *price* for rates or *book* to enquire!"
-        )
+    "room": (
+        "🏨 *Kapila River Front – Room Details*\n\n"
+        "We have *5 identical Heritage Rooms*.\n\n"
+        "✨ *Room highlights:*\n"
+        "• Spacious high-ceiling interior with warm wooden furnishings\n"
+        "• Handcrafted wooden bed with elegant ambient lighting\n"
+        "• Patterned flooring & tasteful wall art\n"
+        "• Private balcony sit-out with comfortable seating\n"
+        "• Large glass doors – seamless indoor-outdoor flow\n"
+        "• Attached modern washroom with modern fittings\n\n"
+        "🔌 *In-room facilities:*\n"
+        "• Air Conditioning (A/C)\n"
+        "• Television (TV)\n"
+        "• Hot water kettle\n\n"
+        "👥 *Occupancy:*\n"
+        "• Min 2 / Max 3 guests per room\n"
+        "• Total: 5 rooms → up to 15 guests (with extra beds)\n\n"
+        "ℹ️ One room type only. No river-facing view.\n\n"
+        "Type *price* for rates or *book* to enquire!"
+    ),
 
     # ── Booking enquiry ──
-    if any(w in t for w in ("book", "reserve", "available", "availability",
-                             "checkin", "check-in", "checkout", "check-out")):
-        return (
-            "📅 *Booking Enquiry*\n\n"
-            "We'd love to host you at Kapila River Front! 🌿\n\n"
-            "🕐 *Check-in:* 1:00 PM\n"
-            "🕚 *Check-out:* 11:00 AM\n\n"
-            "🔍 *Check availability instantly!*\n"
-            "Just send a date like:\n"
-            "• *20 mar 2026*\n"
-            "• *15/04/2026*\n"
-            "• *25th may 2026*\n\n"
-            "Or share your booking details:\n"
-            "1️⃣ Check-in date\n"
-            "2️⃣ Check-out date\n"
-            "3️⃣ Number of guests\n"
-            "4️⃣ Number of rooms needed\n"
-            "5️⃣ Traveling with pets? (Yes/No)\n\n"
-            "📞 Or call reception: *+91-XXXXX-XXXXX*\n\n"
-            "✅ Booking is confirmed only after *100% payment*.\n"
-            "Type *cancel* for cancellation policy.\n"
-            "Type *payment* for bank details."
-        )
+    "book": (
+        "📅 *Booking Enquiry*\n\n"
+        "We'd love to host you at Kapila River Front! 🌿\n\n"
+        "🕐 *Check-in:* 1:00 PM\n"
+        "🕚 *Check-out:* 11:00 AM\n\n"
+        "🔍 *Check availability instantly!*\n"
+        "Just send a date like:\n"
+        "• *20 mar 2026*\n"
+        "• *15/04/2026*\n"
+        "• *25th may 2026*\n\n"
+        "Or share your booking details:\n"
+        "1️⃣ Check-in date\n"
+        "2️⃣ Check-out date\n"
+        "3️⃣ Number of guests\n"
+        "4️⃣ Number of rooms needed\n"
+        "5️⃣ Traveling with pets? (Yes/No)\n\n"
+        "📞 Or call reception: *+91-XXXXX-XXXXX*\n\n"
+        "✅ Booking is confirmed only after *100% payment*.\n"
+        "Type *cancel* for cancellation policy.\n"
+        "Type *payment* for bank details."
+    ),
 
     # ── Pet policy ──
-    if any(w in t for w in ("pet", "dog", "cat", "puppy", "animal")):
-        return (
-            "🐾 *Pet Policy – Kapila River Front*\n\n"
-            "Yes! We *welcome pets* and allow them *inside rooms*. 🐶\n\n"
-            "📌 *Pet Limits:*\n"
-            "• Max *2 pets per room*\n"
-            "• Max *6 pets across all 5 rooms* "
-            "(if one or more are small breeds like Shih Tzu)\n\n"
-            "💰 *Pet Charges:*\n"
-            "• *₹2,000 per pet* – includes boiled vegetables & cooked rice\n"
-            "• *₹500 extra per pet* – for chicken add-on 🍗\n\n"
-            "⚠️ *Guidelines:*\n"
-            "• Inform the reservation team *in advance*\n"
-            "• Pets must be *leashed if not fully trained*\n"
-            "• Owners are *fully responsible* for pet behavior\n"
-            "• The property is *open to the riverfront* with no barricading "
-            "– please *supervise pets closely* near the river\n"
-            "• Any damage or extra cleaning will be *charged to the guest*\n\n"
-            "Type *book* to make a reservation or *price* for rates."
-        )
+    "pet": (
+        "🐾 *Pet Policy – Kapila River Front*\n\n"
+        "Yes! We *welcome pets* and allow them *inside rooms*. 🐶\n\n"
+        "📌 *Pet Limits:*\n"
+        "• Max *2 pets per room*\n"
+        "• Max *6 pets across all 5 rooms* "
+        "(if one or more are small breeds like Shih Tzu)\n\n"
+        "💰 *Pet Charges:*\n"
+        "• *₹2,000 per pet* – includes boiled vegetables & cooked rice\n"
+        "• *₹500 extra per pet* – for chicken add-on 🍗\n\n"
+        "⚠️ *Guidelines:*\n"
+        "• Inform the reservation team *in advance*\n"
+        "• Pets must be *leashed if not fully trained*\n"
+        "• Owners are *fully responsible* for pet behavior\n"
+        "• The property is *open to the riverfront* with no barricading "
+        "– please *supervise pets closely* near the river\n"
+        "• Any damage or extra cleaning will be *charged to the guest*\n\n"
+        "Type *book* to make a reservation or *price* for rates."
+    ),
 
     # ── Cancellation policy ──
-    if any(w in t for w in ("cancel", "cancellation", "refund", "policy")):
-        return (
-            "❌ *Cancellation Policy*\n\n"
-            "✅ Booking is confirmed only after *100% payment*.\n\n"
-            "📌 *Refund rules:*\n"
-            "• *15+ days* before check-in → *Full refund* (free cancellation)\n"
-            "• *14–15 days* before → *25% deducted*\n"
-            "• *10 days* before → *50% deducted*\n"
-            "• *Less than 7 days* → *No refund*\n\n"
-            "For any changes to your booking, please contact reception:\n"
-            "📞 *+91-XXXXX-XXXXX*"
-        )
+    "cancel": (
+        "❌ *Cancellation Policy*\n\n"
+        "✅ Booking is confirmed only after *100% payment*.\n\n"
+        "📌 *Refund rules:*\n"
+        "• *15+ days* before check-in → *Full refund* (free cancellation)\n"
+        "• *14–15 days* before → *25% deducted*\n"
+        "• *10 days* before → *50% deducted*\n"
+        "• *Less than 7 days* → *No refund*\n\n"
+        "For any changes to your booking, please contact reception:\n"
+        "📞 *+91-XXXXX-XXXXX*"
+    ),
 
     # ── Payment / bank details ──
-    if any(w in t for w in ("payment", "pay", "bank", "account", "upi",
-                             "transfer", "neft", "imps", "ifsc")):
-        return (
-            "🏦 *Payment Details*\n\n"
-            "Please transfer to the following account:\n\n"
-            "🏛 *Bank:* CANARA BANK\n"
-            "👤 *Account Name:* KAPILA RIVER FRONT\n"
-            "🔢 *Account Number:* 120032425830\n"
-            "🏷 *IFSC Code:* CNRB0002655\n"
-            "📍 *Branch:* Ramakrishna Nagar, Mysore\n\n"
-            "✅ Booking is confirmed only after *100% payment*.\n\n"
-            "After payment, please share the screenshot here "
-            "or send it to our reception.\n"
-            "📞 *+91-XXXXX-XXXXX*"
-        )
+    "payment": (
+        "🏦 *Payment Details*\n\n"
+        "Please transfer to the following account:\n\n"
+        "🏛 *Bank:* CANARA BANK\n"
+        "👤 *Account Name:* KAPILA RIVER FRONT\n"
+        "🔢 *Account Number:* 120032425830\n"
+        "🏷 *IFSC Code:* CNRB0002655\n"
+        "📍 *Branch:* Ramakrishna Nagar, Mysore\n\n"
+        "✅ Booking is confirmed only after *100% payment*.\n\n"
+        "After payment, please share the screenshot here "
+        "or send it to our reception.\n"
+        "📞 *+91-XXXXX-XXXXX*"
+    ),
 
     # ── Outdoor sports & activities ──
-    if any(w in t for w in ("activit", "sport", "outdoor", "play", "game", "cricket",
-                             "badminton", "football", "basketball", "archery", "cycling",
-                             "indoor", "table tennis", "foosball", "carrom", "chess")):
-        return (
-            "🎯 *Kapila River Front – Activities*\n\n"
-            "🏏 *Outdoor Sports:*\n"
-            "• Netted Cricket\n"
-            "• Badminton\n"
-            "• Football\n"
-            "• Basketball\n"
-            "• Archery\n"
-            "• Cycling\n\n"
-            "🎲 *Indoor Games:*\n"
-            "• Table Tennis\n"
-            "• Foosball\n"
-            "• Carrom\n"
-            "• Chess\n"
-            "• Puzzle Games\n\n"
-            "🏊 *Recreation:*\n"
-            "• Swimming Pool\n"
-            "• Music System\n\n"
-            "✅ All activities are *included* with your stay!\n\n"
-            "Type *pool* for swimming pool details."
-        )
+    "activities": (
+        "🎯 *Kapila River Front – Activities*\n\n"
+        "🏏 *Outdoor Sports:*\n"
+        "• Netted Cricket\n"
+        "• Badminton\n"
+        "• Football\n"
+        "• Basketball\n"
+        "• Archery\n"
+        "• Cycling\n\n"
+        "🎲 *Indoor Games:*\n"
+        "• Table Tennis\n"
+        "• Foosball\n"
+        "• Carrom\n"
+        "• Chess\n"
+        "• Puzzle Games\n\n"
+        "🏊 *Recreation:*\n"
+        "• Swimming Pool\n"
+        "• Music System\n\n"
+        "✅ All activities are *included* with your stay!\n\n"
+        "Type *pool* for swimming pool details."
+    ),
 
     # ── Amenities ──
-    if any(w in t for w in ("amenit", "facilit", "include", "provide", "offer")):
-        return (
-            "🌿 *Kapila River Front – Amenities*\n\n"
-            "🏠 *In-Room:*\n"
-            "• Air Conditioning\n"
-            "• Television\n"
-            "• Hot water kettle\n"
-            "• Attached modern washroom\n"
-            "• Private balcony sit-out\n\n"
-            "🏟 *On-Site:*\n"
-            "• Swimming Pool\n"
-            "• Netted Cricket, Badminton, Football, Basketball\n"
-            "• Archery & Cycling\n"
-            "• Table Tennis, Foosball, Carrom, Chess\n"
-            "• Music System\n\n"
-            "🍽 *Included:*\n"
-            "• All meals (welcome drinks, lunch, high tea, dinner & breakfast)\n"
-            "• Peaceful riverside setting\n"
-            "• Heritage-style architecture\n\n"
-            "Type *activities* for the full list or *price* for rates."
-        )
+    "amenities": (
+        "🌿 *Kapila River Front – Amenities*\n\n"
+        "🏠 *In-Room:*\n"
+        "• Air Conditioning\n"
+        "• Television\n"
+        "• Hot water kettle\n"
+        "• Attached modern washroom\n"
+        "• Private balcony sit-out\n\n"
+        "🏟 *On-Site:*\n"
+        "• Swimming Pool\n"
+        "• Netted Cricket, Badminton, Football, Basketball\n"
+        "• Archery & Cycling\n"
+        "• Table Tennis, Foosball, Carrom, Chess\n"
+        "• Music System\n\n"
+        "🍽 *Included:*\n"
+        "• All meals (welcome drinks, lunch, high tea, dinner & breakfast)\n"
+        "• Peaceful riverside setting\n"
+        "• Heritage-style architecture\n\n"
+        "Type *activities* for the full list or *price* for rates."
+    ),
 
     # ── Swimming pool ──
-    if any(w in t for w in ("pool", "swim", "swimming")):
-        return (
-            "🏊 *Swimming Pool*\n\n"
-            "Yes! We have a swimming pool on-site. 💦\n\n"
-            "• Accessible to all in-house guests\n"
-            "• Included with your stay – no extra charge\n"
-            "• Perfect for a refreshing dip after outdoor sports!\n\n"
-            "Type *activities* to see all the fun things to do."
-        )
+    "pool": (
+        "🏊 *Swimming Pool*\n\n"
+        "Yes! We have a swimming pool on-site. 💦\n\n"
+        "• Accessible to all in-house guests\n"
+        "• Included with your stay – no extra charge\n"
+        "• Perfect for a refreshing dip after outdoor sports!\n\n"
+        "Type *activities* to see all the fun things to do."
+    ),
 
     # ── Location / directions ──
-    if any(w in t for w in ("location", "address", "direction", "where",
-                             "reach", "map", "route", "mysore", "mysuru")):
-        return (
-            "📍 *How to Reach Kapila River Front*\n\n"
-            "Kapila River Front is a luxury farm villa "
-            "on the riverside near Mysore.\n\n"
-            "📌 For exact location & Google Maps pin, "
-            "please contact our reception:\n"
-            "📞 *+91-XXXXX-XXXXX*\n\n"
-            "We'll share the directions right away! 🗺"
-        )
+    "location": (
+        "📍 *How to Reach Kapila River Front*\n\n"
+        "Kapila River Front is a luxury farm villa "
+        "on the riverside near Mysore.\n\n"
+        "📌 For exact location & Google Maps pin, "
+        "please contact our reception:\n"
+        "📞 *+91-XXXXX-XXXXX*\n\n"
+        "We'll share the directions right away! 🗺"
+    ),
 
     # ── Food / dining ──
-    if any(w in t for w in ("food", "meal", "breakfast", "lunch", "dinner",
-                             "dining", "eat", "restaurant", "tea", "drink")):
-        return (
-            "🍽 *Dining at Kapila River Front*\n\n"
-            "All meals are *included* with your stay:\n\n"
-            "☕ Welcome drinks on arrival\n"
-            "🍛 Lunch\n"
-            "🍵 High tea / evening snacks\n"
-            "🍽 Dinner\n"
-            "🥞 Breakfast (next morning)\n\n"
-            "For special dietary needs or meal preferences, "
-            "please inform reception in advance:\n"
-            "📞 *+91-XXXXX-XXXXX*"
-        )
+    "food": (
+        "🍽 *Dining at Kapila River Front*\n\n"
+        "All meals are *included* with your stay:\n\n"
+        "☕ Welcome drinks on arrival\n"
+        "🍛 Lunch\n"
+        "🍵 High tea / evening snacks\n"
+        "🍽 Dinner\n"
+        "🥞 Breakfast (next morning)\n\n"
+        "For special dietary needs or meal preferences, "
+        "please inform reception in advance:\n"
+        "📞 *+91-XXXXX-XXXXX*"
+    ),
 
     # ── Valentine's Day ──
-    if any(w in t for w in ("valentine", "14 feb", "14th feb")):
-        return (
-            "💝 *Valentine's Day Special – 14th February*\n\n"
-            "🛏 *₹14,000 per night*\n"
-            "• Double occupancy\n"
-            "• All meals included\n\n"
-            "A perfect romantic riverside getaway! 🌹\n\n"
-            "Type *book* to reserve or *price* for the full rate card."
-        )
+    "valentine": (
+        "💝 *Valentine's Day Special – 14th February*\n\n"
+        "🛏 *₹14,000 per night*\n"
+        "• Double occupancy\n"
+        "• All meals included\n\n"
+        "A perfect romantic riverside getaway! 🌹\n\n"
+        "Type *book* to reserve or *price* for the full rate card."
+    ),
 
     # ── Dasara ──
-    if any(w in t for w in ("dasara", "dussehra", "october fest")):
-        return (
-            "🎆 *Dasara Festival Rates*\n\n"
-            "During the *10-day Dasara festival*:\n"
-            "• *₹13,000 per night* (all days)\n"
-            "• All meals included\n\n"
-            "Type *book* to reserve or *price* for the full rate card."
-        )
+    "dasara": (
+        "🎆 *Dasara Festival Rates*\n\n"
+        "During the *10-day Dasara festival*:\n"
+        "• *₹13,000 per night* (all days)\n"
+        "• All meals included\n\n"
+        "Type *book* to reserve or *price* for the full rate card."
+    ),
 
     # ── Thank you / bye ──
-    if any(w in t for w in ("thank", "thanks", "bye", "goodbye", "see you")):
-        return (
-            "Thank you for choosing *Kapila River Front*! 🙏🌿\n\n"
-            "We look forward to hosting you.\n"
-            "Feel free to message anytime!\n\n"
-            "Have a wonderful day! 😊"
-        )
+    "thanks": (
+        "Thank you for choosing *Kapila River Front*! 🙏🌿\n\n"
+        "We look forward to hosting you.\n"
+        "Feel free to message anytime!\n\n"
+        "Have a wonderful day! 😊"
+    ),
 
     # ── Menu / help ──
-    if any(w in t for w in ("menu", "help", "option", "what can")):
-        return (
-            "📋 *Here's everything I can help with:*\n\n"
-            "🛏 *room* – Room details & features\n"
-            "💰 *price* – 2026 Rate card\n"
-            "🎆 *newyear* – NYE special package\n"
-            "💝 *valentine* – Valentine's Day offer\n"
-            "📅 *book* – Booking enquiry\n"
-            "🐾 *pet* – Pet policy & charges\n"
-            "🎯 *activities* – Sports & games\n"
-            "🌿 *amenities* – Facilities overview\n"
-            "🏊 *pool* – Swimming pool info\n"
-            "🍽 *food* – Dining & meals\n"
-            "📍 *location* – How to reach us\n"
-            "❌ *cancel* – Cancellation policy\n"
-            "🏦 *payment* – Bank details\n"
-            "👨‍💼 *reception* – Talk to a person\n\n"
-            "Just type any keyword! 😊"
-        )
+    "menu": (
+        "📋 *Here's everything I can help with:*\n\n"
+        "🛏 *room* – Room details & features\n"
+        "💰 *price* – 2026 Rate card\n"
+        "🎆 *newyear* – NYE special package\n"
+        "💝 *valentine* – Valentine's Day offer\n"
+        "📅 *book* – Booking enquiry\n"
+        "🐾 *pet* – Pet policy & charges\n"
+        "🎯 *activities* – Sports & games\n"
+        "🌿 *amenities* – Facilities overview\n"
+        "🏊 *pool* – Swimming pool info\n"
+        "🍽 *food* – Dining & meals\n"
+        "📍 *location* – How to reach us\n"
+        "❌ *cancel* – Cancellation policy\n"
+        "🏦 *payment* – Bank details\n"
+        "👨‍💼 *reception* – Talk to a person\n\n"
+        "Just type any keyword! 😊"
+    ),
 
     # ── Default fallback ──
-    return (
+    "default": (
         "Thank you for reaching out to "
         "*Kapila River Front*! 🌿\n\n"
         "I can help you with:\n"
@@ -568,188 +689,223 @@ def generate_reply(text: str) -> str:
         "📋 *menu* – See all options\n\n"
         "Or type your question and our team "
         "will get back to you! 🙏"
-    )
+    ),
+}
+
+
+# Longer messages are classified uncached to keep cache keys small.
+_REPLY_CACHE_MAX_KEY = 128
+
+
+def _normalize(text: str) -> str:
+    """Lowercase text and collapse whitespace – the form the matchers expect."""
+    return " ".join(text.lower().split())
+
+
+def generate_reply(text: str) -> str:
+    """Return a reply based on keyword matching against real Kapila resort info."""
+    return _reply_for_normalized(_normalize(text))
+
+
+def _reply_for_normalized(norm: str) -> str:
+    """generate_reply for text that has already been through _normalize."""
+    if len(norm) > _REPLY_CACHE_MAX_KEY:
+        return _reply_for.__wrapped__(norm)
+    return _reply_for(norm)
+
+
+@functools.lru_cache(maxsize=2048)
+def _reply_for(norm: str) -> str:
+    return REPLIES[_classify(norm) or "default"]
 
 
 # ──────────────────────────────────────────────
 # Send a WhatsApp message via the Graph API
 # ──────────────────────────────────────────────
+# Pre-encoded fixed parts of a text-message payload; only "to" and the
+# body are serialized per send, and orjson handles their escaping.
+_TEXT_PAYLOAD_HEAD = b'{"messaging_product":"whatsapp","to":'
+_TEXT_PAYLOAD_MID = b',"type":"text","text":{"body":'
+_TEXT_PAYLOAD_TAIL = b"}}"
+
+
 async def send_message(to: str, message: str) -> None:
     """Send a text message through the Meta WhatsApp Cloud API."""
-    headers = {
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {"body": message},
-    }
+    content = b"".join((
+        _TEXT_PAYLOAD_HEAD, orjson.dumps(to),
+        _TEXT_PAYLOAD_MID, orjson.dumps(message),
+        _TEXT_PAYLOAD_TAIL,
+    ))
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                GRAPH_API_URL, headers=headers, json=payload
+    try:
+        response = await app.state.http.post(
+            GRAPH_API_URL, content=content, headers=_HEADERS
+        )
+        # The success body is an ID confirmation we never use – only decode
+        # it when the Graph API reports an error worth reading.
+        if response.is_error:
+            logger.error(
+                "send_message  | to=%s | status=%s | response=%s",
+                to, response.status_code, response.text,
             )
+        else:
             logger.info("send_message  | to=%s | status=%s", to, response.status_code)
-            logger.info("send_message  | response=%s", response.text)
-        except httpx.RequestError as exc:
-            logger.error("send_message  | request failed: %s", exc)
+    except httpx.RequestError as exc:
+        logger.error("send_message  | request failed: %s", exc)
 
 
 # ──────────────────────────────────────────────
 # Send interactive button menus via the Graph API
 # ──────────────────────────────────────────────
-async def _send_interactive(to: str, body_text: str, buttons: list[dict]) -> None:
-    """Low-level helper to send any interactive button message."""
-    headers = {
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    payload = {
+def _encode_interactive(body_text: str, buttons: list[dict]) -> tuple[bytes, bytes]:
+    """
+    Pre-encode an interactive button payload, split around the recipient
+    so only "to" has to be serialized per send.
+    """
+    payload = orjson.dumps({
         "messaging_product": "whatsapp",
-        "to": to,
+        "to": "__TO__",
         "type": "interactive",
         "interactive": {
             "type": "button",
             "body": {"text": body_text},
             "action": {"buttons": buttons},
         },
-    }
+    })
+    head, tail = payload.split(b'"__TO__"')
+    return head, tail
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                GRAPH_API_URL, headers=headers, json=payload
-            )
-            logger.info("send_buttons  | to=%s | status=%s", to, response.status_code)
-            logger.info("send_buttons  | response=%s", response.text)
-        except httpx.RequestError as exc:
-            logger.error("send_buttons  | request failed: %s", exc)
 
+# Reply buttons for each menu, built once and reused on every send.
+_MAIN_MENU_BUTTONS = [
+    {"type": "reply", "reply": {"id": "availability", "title": "Availability 📅"}},
+    {"type": "reply", "reply": {"id": "price", "title": "2026 Rate Card 💰"}},
+    {"type": "reply", "reply": {"id": "more", "title": "More Options 📋"}},
+]
+
+_MORE_OPTIONS_BUTTONS = [
+    {"type": "reply", "reply": {"id": "room", "title": "Room Details 🛏"}},
+    {"type": "reply", "reply": {"id": "activities", "title": "Activities 🎯"}},
+    {"type": "reply", "reply": {"id": "pet_policies", "title": "Pet & Policies 🐾"}},
+]
+
+_PET_POLICIES_BUTTONS = [
+    {"type": "reply", "reply": {"id": "pet", "title": "Pet Policy 🐾"}},
+    {"type": "reply", "reply": {"id": "cancel", "title": "Cancellation ❌"}},
+    {"type": "reply", "reply": {"id": "payment", "title": "Payment Info 🏦"}},
+]
+
+_POLICIES_BUTTONS = [
+    {"type": "reply", "reply": {"id": "cancel", "title": "Cancellation ❌"}},
+    {"type": "reply", "reply": {"id": "payment", "title": "Payment Info 🏦"}},
+    {"type": "reply", "reply": {"id": "reception", "title": "Reception 👨‍💼"}},
+]
 
-async def send_button_message(to: str) -> None:
-    """Main welcome menu – shown on greeting."""
-    await _send_interactive(
-        to,
+# Every interactive menu, pre-encoded once at import and keyed by name.
+_MENU_PAYLOADS: dict[str, tuple[bytes, bytes]] = {
+    # Main welcome menu – shown on greeting.
+    "main": _encode_interactive(
         "Welcome to *Kapila River Front*! 🌿🏨\n"
         "A Luxury Farm Villa on the Riverside\n\n"
         "How may I assist you today?",
-        [
-            {"type": "reply", "reply": {"id": "availability", "title": "Availability 📅"}},
-            {"type": "reply", "reply": {"id": "price", "title": "2026 Rate Card 💰"}},
-            {"type": "reply", "reply": {"id": "more", "title": "More Options 📋"}},
-        ],
-    )
-
-
-async def send_more_options(to: str) -> None:
-    """Second menu – room details, activities, pets, policies."""
-    await _send_interactive(
-        to,
+        _MAIN_MENU_BUTTONS,
+    ),
+    # Second menu – room details, activities, pets, policies.
+    "more": _encode_interactive(
         "More about *Kapila River Front* 🌿",
-        [
-            {"type": "reply", "reply": {"id": "room", "title": "Room Details 🛏"}},
-            {"type": "reply", "reply": {"id": "activities", "title": "Activities 🎯"}},
-            {"type": "reply", "reply": {"id": "pet_policies", "title": "Pet & Policies 🐾"}},
-        ],
-    )
-
-
-async def send_pet_policies_menu(to: str) -> None:
-    """Third menu – pet policy, cancellation, payment."""
-    await _send_interactive(
-        to,
+        _MORE_OPTIONS_BUTTONS,
+    ),
+    # Third menu – pet policy, cancellation, payment.
+    "pet_policies": _encode_interactive(
         "🐾 *Pet & Policies*",
-        [
-            {"type": "reply", "reply": {"id": "pet", "title": "Pet Policy 🐾"}},
-            {"type": "reply", "reply": {"id": "cancel", "title": "Cancellation ❌"}},
-            {"type": "reply", "reply": {"id": "payment", "title": "Payment Info 🏦"}},
-        ],
-    )
+        _PET_POLICIES_BUTTONS,
+    ),
+    # Third menu – cancellation, payment, reception.
+    "policies": _encode_interactive(
+        "📄 *Booking & Policies*",
+        _POLICIES_BUTTONS,
+    ),
+}
 
 
-async def send_policies_menu(to: str) -> None:
-    """Third menu – cancellation, payment, reception."""
-    await _send_interactive(
-        to,
-        "📄 *Booking & Policies*",
-        [
-            {"type": "reply", "reply": {"id": "cancel", "title": "Cancellation ❌"}},
-            {"type": "reply", "reply": {"id": "payment", "title": "Payment Info 🏦"}},
-            {"type": "reply", "reply": {"id": "reception", "title": "Reception 👨‍💼"}},
-        ],
-    )
+async def send_menu(to: str, menu: str) -> None:
+    """Send one of the pre-encoded interactive button menus."""
+    head, tail = _MENU_PAYLOADS[menu]
+    content = head + orjson.dumps(to) + tail
+
+    try:
+        response = await app.state.http.post(
+            GRAPH_API_URL, content=content, headers=_HEADERS
+        )
+        if response.is_error:
+            logger.error(
+                "send_buttons  | to=%s | menu=%s | status=%s | response=%s",
+                to, menu, response.status_code, response.text,
+            )
+        else:
+            logger.info("send_buttons  | to=%s | menu=%s | status=%s", to, menu, response.status_code)
+    except httpx.RequestError as exc:
+        logger.error("send_buttons  | request failed: %s", exc)
 
 
 # ──────────────────────────────────────────────
 # Handle interactive button clicks
 # ──────────────────────────────────────────────
-async def handle_button_click(sender: str, button_id: str) -> None:
-    """Route logic based on the button ID the user tapped."""
-    logger.info("button_click  | from=%s | button_id=%s", sender, button_id)
-
-    if button_id == "availability":
-        await send_message(
-            sender,
-            "📅 *Check Room Availability*\n\n"
-            "Send me a date and I'll instantly check "
-            "how many rooms are free!\n\n"
-            "You can type it in any format:\n"
-            "• *20 mar 2026*\n"
-            "• *15/04/2026*\n"
-            "• *25th may 2026*\n"
-            "• *01-06-2026*\n\n"
-            "Go ahead, send your date! 👇"
-        )
-
-    elif button_id == "price":
-        await send_message(sender, generate_reply("price"))
-        await send_button_message(sender)
-
-    elif button_id == "room":
-        await send_message(sender, generate_reply("room"))
-        await send_more_options(sender)
-
-    elif button_id == "activities":
-        await send_message(sender, generate_reply("activities"))
-        await send_more_options(sender)
-
-    elif button_id == "pet":
-        await send_message(sender, generate_reply("pet"))
-        await send_pet_policies_menu(sender)
-
-    elif button_id == "cancel":
-        await send_message(sender, generate_reply("cancel"))
-        await send_pet_policies_menu(sender)
-
-    elif button_id == "payment":
-        await send_message(sender, generate_reply("payment"))
-        await send_pet_policies_menu(sender)
+# Text sent back for each button, and the menu shown after it.
+_BUTTON_REPLIES = {
+    "availability": (
+        "📅 *Check Room Availability*\n\n"
+        "Send me a date and I'll instantly check "
+        "how many rooms are free!\n\n"
+        "You can type it in any format:\n"
+        "• *20 mar 2026*\n"
+        "• *15/04/2026*\n"
+        "• *25th may 2026*\n"
+        "• *01-06-2026*\n\n"
+        "Go ahead, send your date! 👇"
+    ),
+    "price": REPLIES["price"],
+    "room": REPLIES["room"],
+    "activities": REPLIES["activities"],
+    "pet": REPLIES["pet"],
+    "cancel": REPLIES["cancel"],
+    "payment": REPLIES["payment"],
+    "reception": (
+        "👨‍💼 *Connecting you to our reception!*\n\n"
+        "📞 Call us: *+91-XXXXX-XXXXX*\n"
+        "💬 WhatsApp: *+91-XXXXX-XXXXX*\n\n"
+        "Our team (Prajwal – Reservation Team) "
+        "will assist you right away! 🙏"
+    ),
+}
 
-    elif button_id == "more":
-        await send_more_options(sender)
+_BUTTON_FOLLOWUP = {
+    "price": "main",
+    "room": "more",
+    "activities": "more",
+    "pet": "pet_policies",
+    "cancel": "pet_policies",
+    "payment": "pet_policies",
+    "more": "more",
+    "pet_policies": "pet_policies",
+    "policies": "policies",
+}
 
-    elif button_id == "pet_policies":
-        await send_pet_policies_menu(sender)
 
-    elif button_id == "policies":
-        await send_policies_menu(sender)
+async def handle_button_click(sender: str, button_id: str) -> None:
+    """Route logic based on the button ID the user tapped."""
+    reply = _BUTTON_REPLIES.get(button_id)
+    follow_up = _BUTTON_FOLLOWUP.get(button_id)
 
-    elif button_id == "reception":
-        await send_message(
-            sender,
-            "👨‍💼 *Connecting you to our reception!*\n\n"
-            "📞 Call us: *+91-XXXXX-XXXXX*\n"
-            "💬 WhatsApp: *+91-XXXXX-XXXXX*\n\n"
-            "Our team (Prajwal – Reservation Team) "
-            "will assist you right away! 🙏"
-        )
+    # Unknown button – fall back to the default reply and main menu.
+    if reply is None and follow_up is None:
+        reply, follow_up = REPLIES["default"], "main"
 
-    else:
-        await send_message(sender, generate_reply(""))
-        await send_button_message(sender)
+    # Send the reply before the menu so they arrive in that order.
+    if reply is not None:
+        await send_message(sender, reply)
+    if follow_up is not None:
+        await send_menu(sender, follow_up)
 
 
 # ──────────────────────────────────────────────
@@ -765,7 +921,11 @@ async def verify_webhook(
     Meta sends a GET request with hub.mode, hub.verify_token, and
     hub.challenge to verify the webhook URL.
     """
-    if hub_mode == "subscribe" and hub_verify_token == VERIFY_TOKEN:
+    # Constant-time compare so response timing can't leak the token.
+    token_ok = hub_verify_token is not None and hmac.compare_digest(
+        hub_verify_token.encode(), VERIFY_TOKEN.encode()
+    )
+    if hub_mode == "subscribe" and token_ok:
         logger.info("verify        | webhook verified successfully")
         return PlainTextResponse(content=hub_challenge)
 
@@ -776,66 +936,150 @@ async def verify_webhook(
 # ──────────────────────────────────────────────
 # Webhook receiver (POST)
 # ──────────────────────────────────────────────
-@app.post("/webhook")
-async def receive_webhook(request: Request):
+# Whole-message greetings that get the interactive welcome menu.
+GREETINGS = frozenset({
+    "hi", "hello", "hey", "hii", "helo",
+    "good morning", "good afternoon", "good evening",
+})
+
+
+def _iter_messages(body: dict) -> list[dict]:
+    """Flatten entry → changes → value → messages into one list."""
+    # Fast paths: Meta almost always sends exactly one entry with one change,
+    # either carrying messages or only delivery/read statuses.
+    match body:
+        case {"entry": [{"changes": [{"value": {"messages": list() as messages}}]}]}:
+            return messages
+        case {"entry": [{"changes": [{"value": {}}]}]}:
+            return []
+
+    return [
+        msg
+        for e in body.get("entry", [])
+        for change in e.get("changes", [])
+        for msg in change.get("value", {}).get("messages", [])
+    ]
+
+
+async def _process_messages(messages: list[dict]) -> None:
     """
-    Receives incoming messages from WhatsApp, generates a reply,
-    and sends it back to the sender.
+    Reply to every message in a webhook. Different senders are handled
+    concurrently; each sender's own messages stay in order.
     """
-    body = await request.json()
-    logger.info("webhook       | incoming payload: %s", body)
+    by_sender: dict[str, list[dict]] = {}
+    for msg in messages:
+        # Without a string sender there's nobody to reply to, and anything
+        # else (a list, a dict) can't key the grouping.
+        sender = msg.get("from") if isinstance(msg, dict) else None
+        if not isinstance(sender, str):
+            logger.warning("webhook       | skipping malformed message: %r", msg)
+            continue
+        by_sender.setdefault(sender, []).append(msg)
+
+    await asyncio.gather(*(_process_sender(batch) for batch in by_sender.values()))
+
+
+async def _process_sender(batch: list[dict]) -> None:
+    for msg in batch:
+        await _process_message(msg)
+
+
+async def _process_message(msg: dict) -> None:
+    """Generate and send the reply for one incoming message."""
+    sender = msg.get("from")
+    msg_type = msg.get("type")
+
+    try:
+        text = None
+
+        if msg_type == "interactive":
+            try:
+                button_id = msg["interactive"]["button_reply"]["id"]
+            except (KeyError, TypeError):
+                button_id = ""
+            route = f"button:{button_id}"
+            await handle_button_click(sender, button_id)
+
+        elif msg_type == "text":
+            text = msg.get("text", {}).get("body", "")
+
+            # Normalize once; every check below works on this form.
+            norm = _normalize(text)
+            parsed = _parse_date_normalized(norm)
+
+            if norm in GREETINGS:
+                route = "greeting"
+                await send_menu(sender, "main")
+            elif parsed is not None:
+                route = f"availability:{parsed:%d-%m-%Y}"
+                # A sheet reload parses the xlsx – keep that off the event loop.
+                reply = await asyncio.to_thread(check_availability, parsed)
+                await send_message(sender, reply)
+            elif any(w in norm for w in ("menu", "help", "option")):
+                route = "menu"
+                await send_message(sender, REPLIES["menu"])
+                await send_menu(sender, "main")
+            else:
+                route = "reply"
+                reply = _reply_for_normalized(norm)
+                await send_message(sender, reply)
+
+        else:
+            route = f"unhandled:{msg_type}"
+            await send_message(sender, REPLIES["default"])
+            await send_menu(sender, "main")
+
+        # One record per message, written once its replies are sent.
+        logger.info("webhook       | from=%s | route=%s | text=%s", sender, route, text)
+
+    except Exception as exc:
+        logger.exception(
+            "webhook       | from=%s | type=%s | error processing message: %s",
+            sender, msg_type, exc,
+        )
+
 
+@app.post("/webhook")
+async def receive_webhook(
+    request: Request, background_tasks: BackgroundTasks
+) -> dict[str, str]:
+    """
+    Receives incoming messages from WhatsApp and acknowledges them right
+    away; replies are sent from a background task after the response, so
+    Meta never waits on our outbound Graph API calls.
+    """
     try:
-        entry = body.get("entry", [])
-        for e in entry:
-            changes = e.get("changes", [])
-            for change in changes:
-                value = change.get("value", {})
-                messages = value.get("messages", [])
-
-                for msg in messages:
-                    sender = msg.get("from")
-                    msg_type = msg.get("type")
-
-                    if msg_type == "interactive":
-                        button_id = (
-                            msg.get("interactive", {})
-                            .get("button_reply", {})
-                            .get("id", "")
-                        )
-                        await handle_button_click(sender, button_id)
-
-                    elif msg_type == "text":
-                        text = msg.get("text", {}).get("body", "")
-                        logger.info("webhook       | from=%s | text=%s", sender, text)
-
-                        greetings = ("hi", "hello", "hey", "hii", "helo",
-                                     "good morning", "good afternoon",
-                                     "good evening")
-
-                        parsed = parse_date(text)
-
-                        if text.lower().strip() in greetings:
-                            await send_button_message(sender)
-                        elif parsed is not None:
-                            logger.info("webhook       | date detected: %s", parsed.strftime("%d-%m-%Y"))
-                            reply = check_availability(parsed)
-                            await send_message(sender, reply)
-                        elif any(w in text.lower() for w in ("menu", "help", "option")):
-                            await send_message(sender, generate_reply("menu"))
-                            await send_button_message(sender)
-                        else:
-                            reply = generate_reply(text)
-                            await send_message(sender, reply)
-
-                    else:
-                        logger.info("webhook       | from=%s | unhandled type=%s", sender, msg_type)
-                        await send_message(sender, generate_reply(""))
-                        await send_button_message(sender)
-
-                    logger.info("webhook       | replied to=%s", sender)
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as exc:
+        logger.warning("webhook       | malformed JSON body: %s", exc)
+        return {"status": "ok"}
+    logger.debug("webhook       | incoming payload: %s", body)
 
+    try:
+        messages = _iter_messages(body)
     except Exception as exc:
-        logger.exception("webhook       | error processing message: %s", exc)
+        logger.exception("webhook       | malformed payload: %s", exc)
+        return {"status": "ok"}
+
+    # Delivery/read receipts ("statuses") outnumber real messages and
+    # carry nothing to reply to – acknowledge them without further work.
+    if not messages:
+        return {"status": "ok"}
 
+    logger.info("webhook       | received %s entries", len(body.get("entry", [])))
+    background_tasks.add_task(_process_messages, messages)
     return {"status": "ok"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # "auto" picks uvloop when it's installed (as on Render), and falls back
+    # to asyncio where it isn't, e.g. on Windows.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="auto",
+        http="httptools",
+    )